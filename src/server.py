@@ -8,12 +8,42 @@ from datetime import datetime
 import time
 from math import sin
 
+try:
+    import uvloop
+except ImportError:  # not available on Windows, fall back to the default event loop
+    uvloop = None
 from asyncua import ua, uamethod, Server
+from asyncua.common.callback import CallbackType
+from asyncua.common.structures104 import new_struct, new_struct_field
 
 
 _logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+# Shortcuts for building and writing DataValues with an explicit VariantType in the update loop
+_DV = ua.DataValue
+_V = ua.Variant
+_INT64 = ua.VariantType.Int64
+_DOUBLE = ua.VariantType.Double
+_STRING = ua.VariantType.String
+_BOOLEAN = ua.VariantType.Boolean
+_EXTENSION_OBJECT = ua.VariantType.ExtensionObject
+_VALUE = ua.AttributeIds.Value
+
+# Prebuilt DataValues for the few distinct values some variables cycle through (pump status,
+# static command names, alarm flag, zero readings, command success). They are shared between
+# writes and must never be mutated, because the address space and queued subscription
+# notifications keep a reference to the DataValue that was written.
+_SHARED_DATAVALUES = {
+    (value, varianttype): _DV(_V(value, varianttype))
+    for varianttype, values in (
+        (_STRING, ("Idle", "Running", "Alarm", "None", "stopPump", "startPump", "resetFilter", "changeOil")),
+        (_INT64, (0, 1)),
+        (_BOOLEAN, (True, False)),
+    )
+    for value in values
+}
+
 
 class SubHandler(object):
     """
@@ -31,6 +61,18 @@ class PumpController:
     """
     Class to handle pump control and state
     """
+    # Fixed attribute layout, read many times per tick by the update loop
+    __slots__ = (
+        "default_operating_level", "target_level",
+        "filter_degradation_base_rate", "filter_degradation_load_factor",
+        "filter_base_per_sec", "filter_load_per_sec",
+        "last_command", "command_success", "settings_changed",
+        "in_alarm_state", "alarm_start_time", "previous_target_level", "auto_reset_minutes",
+        "oil_change_hours", "oil_depletion_per_sec",
+        "min_inflow_temp", "max_inflow_temp", "temp_amplitude", "temp_midpoint",
+        "base_bearing_temp", "max_bearing_temp", "bearing_span",
+    )
+
     def __init__(self):
         # Get configuration from environment variables with defaults
         self.default_operating_level = int(os.environ.get("PUMP_DEFAULT_OPERATING_LEVEL", 75))
@@ -44,10 +86,16 @@ class PumpController:
         self.filter_degradation_base_rate = 0.1  # Minimal degradation even at idle
         # Calculate load factor based on environment variable
         self.filter_degradation_load_factor = (100.0 / filter_degradation_minutes) - self.filter_degradation_base_rate
+        # Per-second rates used by the update loop
+        self.filter_base_per_sec = self.filter_degradation_base_rate / 60.0
+        self.filter_load_per_sec = self.filter_degradation_load_factor / 60.0
         
         # Track the last command executed
         self.last_command = "None"
         self.command_success = True
+        # Set whenever a setting or the command feedback changes, so the update loop only
+        # publishes those values after a change (True to publish them on the first tick)
+        self.settings_changed = True
         # Alarm state tracking
         self.in_alarm_state = False
         self.alarm_start_time = 0
@@ -56,52 +104,76 @@ class PumpController:
         
         # Oil parameters
         self.oil_change_hours = int(os.environ.get("PUMP_OIL_CHANGE_HOURS", 2000))  # Run hours until oil change needed
+        # At 100% operating level, oil should last for oil_change_hours
+        self.oil_depletion_per_sec = 100.0 / (self.oil_change_hours * 3600.0)
         
         # Temperature parameters
         self.min_inflow_temp = float(os.environ.get("PUMP_MIN_INFLOW_TEMP", 15.0))  # °C
         self.max_inflow_temp = float(os.environ.get("PUMP_MAX_INFLOW_TEMP", 25.0))  # °C
+        self.temp_amplitude = (self.max_inflow_temp - self.min_inflow_temp) / 2
+        self.temp_midpoint = (self.max_inflow_temp + self.min_inflow_temp) / 2
         self.base_bearing_temp = float(os.environ.get("PUMP_BASE_BEARING_TEMP", 35.0))  # °C
         self.max_bearing_temp = float(os.environ.get("PUMP_MAX_BEARING_TEMP", 80.0))  # °C
+        self.bearing_span = self.max_bearing_temp - self.base_bearing_temp
         
         # Log the configuration
-        _logger.info(f"Pump configured with: operating level={self.default_operating_level}%, "
-                    f"filter degradation={filter_degradation_minutes} minutes, "
-                    f"auto-reset={self.auto_reset_minutes} minutes, "
-                    f"oil change={self.oil_change_hours} hours")
+        _logger.info("Pump configured with: operating level=%s%%, "
+                     "filter degradation=%s minutes, "
+                     "auto-reset=%s minutes, "
+                     "oil change=%s hours",
+                     self.default_operating_level, filter_degradation_minutes,
+                     self.auto_reset_minutes, self.oil_change_hours)
+
+    def _record_command(self, command, success):
+        """Record the last command and its result"""
+        self.last_command = command
+        self.command_success = success
+        self.settings_changed = True
+
+    def settings(self):
+        """Return the published settings and command feedback, keyed by their Pump01 variable name"""
+        # Filter degradation rate in minutes (for display)
+        degradation_rate = 30  # Default value
+        if self.filter_degradation_load_factor > 0:
+            degradation_rate = int(100.0 / (self.filter_degradation_base_rate +
+                                            self.filter_degradation_load_factor))
+        return {
+            "filterDegradationRate": degradation_rate,
+            "autoResetMinutes": self.auto_reset_minutes,
+            "defaultOperatingLevel": self.default_operating_level,
+            # Command status variables
+            "lastCommand": self.last_command,
+            "commandSuccess": self.command_success,
+        }
 
     def stop_pump(self):
         _logger.info("Stop command processing")
         self.target_level = 0
-        self.last_command = "stopPump"
-        self.command_success = True
+        self._record_command("stopPump", True)
         return True
 
     def start_pump(self):
         _logger.info("Start command processing")
         self.target_level = self.default_operating_level
-        self.last_command = "startPump"
-        self.command_success = True
+        self._record_command("startPump", True)
         return True
 
     def set_operating_level(self, level):
         if 0 <= level <= 100:
-            _logger.info(f"Setting operating level to {level}")
+            _logger.info("Setting operating level to %s", level)
             self.target_level = level
-            self.last_command = f"setOperatingLevel({level})"
-            self.command_success = True
+            self._record_command(f"setOperatingLevel({level})", True)
             return level
         else:
-            _logger.warning(f"Invalid operating level requested: {level}")
-            self.last_command = f"setOperatingLevel({level})"
-            self.command_success = False
+            _logger.warning("Invalid operating level requested: %s", level)
+            self._record_command(f"setOperatingLevel({level})", False)
             return -1
             
     def set_filter_degradation_rate(self, minutes_to_clog):
         """Set how quickly the filter gets clogged (in minutes to reach 0%)"""
         if minutes_to_clog <= 0:
-            _logger.warning(f"Invalid filter degradation rate: {minutes_to_clog}")
-            self.last_command = f"setFilterDegradationRate({minutes_to_clog})"
-            self.command_success = False
+            _logger.warning("Invalid filter degradation rate: %s", minutes_to_clog)
+            self._record_command(f"setFilterDegradationRate({minutes_to_clog})", False)
             return False
             
         # Calculate the degradation rate per minute
@@ -111,56 +183,53 @@ class PumpController:
         # The rate at full load should achieve the desired minutes_to_clog
         # Formula: (100% / minutes_to_clog) - base_rate
         self.filter_degradation_load_factor = (100.0 / minutes_to_clog) - self.filter_degradation_base_rate
+        self.filter_base_per_sec = self.filter_degradation_base_rate / 60.0
+        self.filter_load_per_sec = self.filter_degradation_load_factor / 60.0
         
-        _logger.info(f"Filter will now clog in approximately {minutes_to_clog} minutes at full load")
-        self.last_command = f"setFilterDegradationRate({minutes_to_clog})"
-        self.command_success = True
+        _logger.info("Filter will now clog in approximately %s minutes at full load", minutes_to_clog)
+        self._record_command(f"setFilterDegradationRate({minutes_to_clog})", True)
         return True
         
     def set_auto_reset_minutes(self, minutes):
         """Set how long the pump stays in alarm state before auto-resetting"""
         if minutes <= 0:
-            _logger.warning(f"Invalid auto-reset minutes: {minutes}")
-            self.last_command = f"setAutoResetMinutes({minutes})"
-            self.command_success = False
+            _logger.warning("Invalid auto-reset minutes: %s", minutes)
+            self._record_command(f"setAutoResetMinutes({minutes})", False)
             return False
             
         self.auto_reset_minutes = float(minutes)
-        _logger.info(f"Auto-reset time set to {minutes} minutes")
-        self.last_command = f"setAutoResetMinutes({minutes})"
-        self.command_success = True
+        _logger.info("Auto-reset time set to %s minutes", minutes)
+        self._record_command(f"setAutoResetMinutes({minutes})", True)
         return True
         
     def reset_filter(self):
         """Manually reset the filter (as if it was replaced)"""
-        self.last_command = "resetFilter"
-        self.command_success = True
+        self._record_command("resetFilter", True)
         return True
         
     def change_oil(self):
         """Manually change the pump oil"""
-        self.last_command = "changeOil"
-        self.command_success = True
+        self._record_command("changeOil", True)
         return True
         
     def enter_alarm_state(self, alarm_type):
         """Put the pump in alarm state"""
         if not self.in_alarm_state:
-            _logger.info(f"Entering alarm state: {alarm_type}")
+            _logger.info("Entering alarm state: %s", alarm_type)
             self.in_alarm_state = True
-            self.alarm_start_time = time.time()
+            self.alarm_start_time = time.monotonic()
             self.previous_target_level = self.target_level
             self.target_level = 0  # Stop the pump
             
-    def check_alarm_auto_reset(self):
-        """Check if it's time to auto-reset from alarm state"""
+    def check_alarm_auto_reset(self, now):
+        """Check if it's time to auto-reset from alarm state (now is a time.monotonic() reading)"""
         if not self.in_alarm_state:
             return False
             
         # Check if the auto-reset time has elapsed
-        elapsed_minutes = (time.time() - self.alarm_start_time) / 60
+        elapsed_minutes = (now - self.alarm_start_time) / 60
         if elapsed_minutes >= self.auto_reset_minutes:
-            _logger.info(f"Auto-resetting pump after {elapsed_minutes:.1f} minutes in alarm state")
+            _logger.info("Auto-resetting pump after %.1f minutes in alarm state", elapsed_minutes)
             self.in_alarm_state = False
             self.target_level = self.previous_target_level  # Restore previous target level
             return True
@@ -173,7 +242,13 @@ pump_controller = PumpController()
 
 # Get update interval from environment with a default of 2.0 seconds
 update_interval = float(os.environ.get("PUMP_UPDATE_INTERVAL", 2.0))
-_logger.info(f"Initial update interval set to {update_interval} seconds")
+_logger.info("Initial update interval set to %s seconds", update_interval)
+# Deadline (time.monotonic()) of the next update loop tick
+next_tick = 0.0
+# Set when next_tick was moved, to wake up the update loop while it waits for the old deadline
+next_tick_changed = asyncio.Event()
+# Set when update_interval changed and still has to be published by the update loop
+update_interval_changed = asyncio.Event()
 
 # Method to stop the pump
 @uamethod
@@ -192,21 +267,21 @@ def start_pump(parent):
 # Method to set the pump's operating level
 @uamethod
 def set_operating_level(parent, level):
-    _logger.warning(f"Set operating level method called with level: {level}")
+    _logger.warning("Set operating level method called with level: %s", level)
     return pump_controller.set_operating_level(level)
 
 
 # Method to configure filter degradation rate
 @uamethod
 def set_filter_degradation_rate(parent, minutes_to_clog):
-    _logger.warning(f"Set filter degradation rate called with: {minutes_to_clog} minutes")
+    _logger.warning("Set filter degradation rate called with: %s minutes", minutes_to_clog)
     return pump_controller.set_filter_degradation_rate(minutes_to_clog)
 
 
 # Method to configure auto-reset minutes
 @uamethod
 def set_auto_reset_minutes(parent, minutes):
-    _logger.warning(f"Set auto-reset minutes called with: {minutes} minutes")
+    _logger.warning("Set auto-reset minutes called with: %s minutes", minutes)
     return pump_controller.set_auto_reset_minutes(minutes)
 
 
@@ -227,20 +302,95 @@ def change_oil(parent):
 # Method to set the update interval
 @uamethod
 def set_update_interval(parent, seconds):
-    global update_interval
+    global update_interval, next_tick
     if seconds < 0.1:
-        _logger.warning(f"Invalid update interval requested: {seconds} (must be ≥ 0.1)")
+        _logger.warning("Invalid update interval requested: %s (must be ≥ 0.1)", seconds)
         return False
     if seconds > 60:
-        _logger.warning(f"Invalid update interval requested: {seconds} (must be ≤ 60)")
+        _logger.warning("Invalid update interval requested: %s (must be ≤ 60)", seconds)
         return False
     
     update_interval = float(seconds)
-    _logger.info(f"Update interval set to {update_interval} seconds")
+    # Restart the tick schedule with the new interval
+    next_tick = time.monotonic() + update_interval
+    next_tick_changed.set()
+    _logger.info("Update interval set to %s seconds", update_interval)
+    # Publish the new interval with the next batch of writes
+    update_interval_changed.set()
     return True
 
 
+def changed_writes(targets, values, last_values):
+    """Return (nodeid, DataValue) writes for the values that differ from last_values, which is updated in place.
+
+    targets holds the (nodeid, varianttype) of each value, in the same order as values.
+    """
+    writes = []
+    for i, value in enumerate(values):
+        if last_values[i] != value:
+            last_values[i] = value
+            nodeid, varianttype = targets[i]
+            writes.append((nodeid, _SHARED_DATAVALUES.get((value, varianttype)) or _DV(_V(value, varianttype))))
+    return writes
+
+
+def ticks_until_event(chance):
+    """Draw the number of ticks until an event with the given per-tick chance occurs (geometric distribution)"""
+    if chance >= 1:
+        return 1
+    return int(math.log(1.0 - random.random()) / math.log(1.0 - chance)) + 1
+
+
+async def write_values(write_attribute_value, writes):
+    """Write a batch of (nodeid, DataValue) pairs with the address space's write_attribute_value.
+
+    Return the NodeIds whose write was refused (the address space reports that with a Bad status).
+    """
+    failed = []
+    for nodeid, datavalue in writes:
+        status = await write_attribute_value(nodeid, _VALUE, datavalue)
+        if not status.is_good():
+            failed.append(nodeid)
+    return failed
+
+
+async def write_batches(write_attribute_value, queue, on_failure):
+    """Background writer: drain write batches queued by the update loop into the address space.
+
+    on_failure is called with the NodeIds of a batch that could not be written.
+    """
+    while True:
+        writes = await queue.get()
+        # Fold in any batches that queued up meanwhile, keeping their order
+        while not queue.empty():
+            writes += queue.get_nowait()
+        try:
+            failed = await write_values(write_attribute_value, writes)
+        except Exception:
+            _logger.exception("Failed to write %d values", len(writes))
+            failed = [nodeid for nodeid, _ in writes]
+        else:
+            if failed:
+                _logger.warning("Address space refused %d of %d values", len(failed), len(writes))
+        if failed:
+            on_failure(failed)
+
+
+def log_writer_exit(task):
+    """Done callback for the background writer: nothing queued gets written once it stopped"""
+    if not task.cancelled():
+        _logger.error("Background writer stopped, values are no longer published", exc_info=task.exception())
+
+
+async def add_static_pump(server, idx, name, values):
+    """Add a pump object whose variables are created from the given name -> value mapping"""
+    pump = await server.nodes.objects.add_object(idx, name)
+    await asyncio.gather(*[pump.add_variable(idx, key, value) for key, value in values.items()])
+    return pump
+
+
 async def main():
+    global next_tick
     server = Server()
     await server.init()
     server.historize_node_data_changes = True
@@ -262,7 +412,7 @@ async def main():
     server_config = await server.nodes.objects.add_object(idx, "ServerConfig")
     
     # Add update interval variable to server configuration
-    update_interval_var = await server_config.add_variable(idx, "updateInterval", update_interval)
+    update_interval_var = await server_config.add_variable(idx, "updateInterval", update_interval, ua.VariantType.Double)
     await update_interval_var.set_writable()
     
     # Add method to set update interval to server configuration
@@ -277,63 +427,57 @@ async def main():
     # populating our address space
     # Defining pump01 (the main pump with all functionality)
     pump01 = await server.nodes.objects.add_object(idx, "Pump01")
-    # operating Level of pump in %
-    performance = await pump01.add_variable(idx, "operatingLevel", 100)
-    await performance.set_writable()
-    # statuses are: Idle, Running, Alarm
-    status = await pump01.add_variable(idx, "status", "Idle", ua.VariantType.String)
-    await status.set_writable()
-    # flow in l/s
-    flow = await pump01.add_variable(idx, "flow", 5.0)
-    await flow.set_writable()
-    # Alarms could be: "PowerFailure", "Leakage", "FilterClogged"
-    alarm = await pump01.add_variable(idx, "activeAlarm", 0)
-    await alarm.set_writable()
-    # Current Energy consumption in W
-    power = await pump01.add_variable(idx, "power", 450)
-    await power.set_writable()
-    # Run hours in h
-    run_hours = await pump01.add_variable(idx, "runHours", 0)
-    await run_hours.set_writable()
-    
-    # Add filter state as percentage (100% = clean, 0% = completely clogged)
-    filter_state = await pump01.add_variable(idx, "filterState", 100)
-    await filter_state.set_writable()
-    
-    # Add oil level as percentage (100% = full, 0% = empty)
-    oil_level = await pump01.add_variable(idx, "oilLevel", 100)
-    await oil_level.set_writable()
-    
-    # Add inflow temperature in °C
-    inflow_temperature = await pump01.add_variable(idx, "inflowTemperature", 20.0)
-    await inflow_temperature.set_writable()
-    
-    # Add bearing temperature in °C
-    bearing_temperature = await pump01.add_variable(idx, "bearingTemperature", 35.0)
-    await bearing_temperature.set_writable()
-    
-    # Add alarm time remaining (seconds until auto-reset)
-    alarm_time_remaining = await pump01.add_variable(idx, "alarmTimeRemaining", 0)
-    await alarm_time_remaining.set_writable()
-    
-    # Add command feedback variables to track last command execution
-    last_command = await pump01.add_variable(idx, "lastCommand", "None", ua.VariantType.String)
-    await last_command.set_writable()
-    
-    command_success = await pump01.add_variable(idx, "commandSuccess", True, ua.VariantType.Boolean)
-    await command_success.set_writable()
-    
-    # Add filter degradation rate in minutes (time to clog at full load)
-    filter_degradation_rate = await pump01.add_variable(idx, "filterDegradationRate", 30)
-    await filter_degradation_rate.set_writable()
-    
-    # Add auto-reset minutes configuration
-    auto_reset_minutes = await pump01.add_variable(idx, "autoResetMinutes", pump_controller.auto_reset_minutes)
-    await auto_reset_minutes.set_writable()
-    
-    # Add default operating level configuration
-    default_operating_level = await pump01.add_variable(idx, "defaultOperatingLevel", pump_controller.default_operating_level)
-    await default_operating_level.set_writable()
+    (
+        performance,
+        status,
+        flow,
+        alarm,
+        power,
+        run_hours,
+        filter_state,
+        oil_level,
+        inflow_temperature,
+        bearing_temperature,
+        alarm_time_remaining,
+        last_command,
+        command_success,
+        filter_degradation_rate,
+        auto_reset_minutes,
+        default_operating_level,
+    ) = pump01_variables = await asyncio.gather(
+        # operating Level of pump in %
+        pump01.add_variable(idx, "operatingLevel", 100, ua.VariantType.Int64),
+        # statuses are: Idle, Running, Alarm
+        pump01.add_variable(idx, "status", "Idle", ua.VariantType.String),
+        # flow in l/s
+        pump01.add_variable(idx, "flow", 5.0, ua.VariantType.Double),
+        # Alarms could be: "PowerFailure", "Leakage", "FilterClogged"
+        pump01.add_variable(idx, "activeAlarm", 0, ua.VariantType.Int64),
+        # Current Energy consumption in W
+        pump01.add_variable(idx, "power", 450, ua.VariantType.Int64),
+        # Run hours in h
+        pump01.add_variable(idx, "runHours", 0, ua.VariantType.Int64),
+        # Add filter state as percentage (100% = clean, 0% = completely clogged)
+        pump01.add_variable(idx, "filterState", 100, ua.VariantType.Int64),
+        # Add oil level as percentage (100% = full, 0% = empty)
+        pump01.add_variable(idx, "oilLevel", 100, ua.VariantType.Int64),
+        # Add inflow temperature in °C
+        pump01.add_variable(idx, "inflowTemperature", 20.0, ua.VariantType.Double),
+        # Add bearing temperature in °C
+        pump01.add_variable(idx, "bearingTemperature", 35.0, ua.VariantType.Double),
+        # Add alarm time remaining (seconds until auto-reset)
+        pump01.add_variable(idx, "alarmTimeRemaining", 0, ua.VariantType.Int64),
+        # Add command feedback variables to track last command execution
+        pump01.add_variable(idx, "lastCommand", "None", ua.VariantType.String),
+        pump01.add_variable(idx, "commandSuccess", True, ua.VariantType.Boolean),
+        # Add filter degradation rate in minutes (time to clog at full load)
+        pump01.add_variable(idx, "filterDegradationRate", 30, ua.VariantType.Int64),
+        # Add auto-reset minutes configuration
+        pump01.add_variable(idx, "autoResetMinutes", pump_controller.auto_reset_minutes, ua.VariantType.Double),
+        # Add default operating level configuration
+        pump01.add_variable(idx, "defaultOperatingLevel", pump_controller.default_operating_level, ua.VariantType.Int64),
+    )
+    await asyncio.gather(*[variable.set_writable() for variable in pump01_variables])
     
     # Add methods to control the pump
     await pump01.add_method(
@@ -397,34 +541,69 @@ async def main():
     )
 
     # Add Pump02 (dummy pump with static values)
-    pump02 = await server.nodes.objects.add_object(idx, "Pump02")
-    await pump02.add_variable(idx, "operatingLevel", 85)
-    await pump02.add_variable(idx, "status", "Running", ua.VariantType.String)
-    await pump02.add_variable(idx, "flow", 4.2)
-    await pump02.add_variable(idx, "activeAlarm", 0)
-    await pump02.add_variable(idx, "power", 380)
-    await pump02.add_variable(idx, "runHours", 120)
-    await pump02.add_variable(idx, "filterState", 92)
-    await pump02.add_variable(idx, "oilLevel", 93)
-    await pump02.add_variable(idx, "inflowTemperature", 21.5)
-    await pump02.add_variable(idx, "bearingTemperature", 37.2)
-    await pump02.add_variable(idx, "lastCommand", "None", ua.VariantType.String)
-    await pump02.add_variable(idx, "commandSuccess", True, ua.VariantType.Boolean)
+    await add_static_pump(server, idx, "Pump02", {
+        "operatingLevel": 85,
+        "status": ua.Variant("Running", ua.VariantType.String),
+        "flow": 4.2,
+        "activeAlarm": 0,
+        "power": 380,
+        "runHours": 120,
+        "filterState": 92,
+        "oilLevel": 93,
+        "inflowTemperature": 21.5,
+        "bearingTemperature": 37.2,
+        "lastCommand": ua.Variant("None", ua.VariantType.String),
+        "commandSuccess": ua.Variant(True, ua.VariantType.Boolean),
+    })
 
     # Add Pump03 (dummy pump with static values)
-    pump03 = await server.nodes.objects.add_object(idx, "Pump03")
-    await pump03.add_variable(idx, "operatingLevel", 65)
-    await pump03.add_variable(idx, "status", "Running", ua.VariantType.String)
-    await pump03.add_variable(idx, "flow", 3.5)
-    await pump03.add_variable(idx, "activeAlarm", 0)
-    await pump03.add_variable(idx, "power", 320)
-    await pump03.add_variable(idx, "runHours", 250)
-    await pump03.add_variable(idx, "filterState", 78)
-    await pump03.add_variable(idx, "oilLevel", 85)
-    await pump03.add_variable(idx, "inflowTemperature", 19.8)
-    await pump03.add_variable(idx, "bearingTemperature", 39.5)
-    await pump03.add_variable(idx, "lastCommand", "None", ua.VariantType.String)
-    await pump03.add_variable(idx, "commandSuccess", True, ua.VariantType.Boolean)
+    await add_static_pump(server, idx, "Pump03", {
+        "operatingLevel": 65,
+        "status": ua.Variant("Running", ua.VariantType.String),
+        "flow": 3.5,
+        "activeAlarm": 0,
+        "power": 320,
+        "runHours": 250,
+        "filterState": 78,
+        "oilLevel": 85,
+        "inflowTemperature": 19.8,
+        "bearingTemperature": 39.5,
+        "lastCommand": ua.Variant("None", ua.VariantType.String),
+        "commandSuccess": ua.Variant(True, ua.VariantType.Boolean),
+    })
+
+    # Pump01 variables published by the update loop, as (PumpStatus field name, node, VariantType).
+    # Both the PumpStatus structure and the loop's write targets are built from these tables
+    pump01_telemetry = (
+        ("power", power, _INT64),
+        ("status", status, _STRING),
+        ("flow", flow, _DOUBLE),
+        ("runHours", run_hours, _INT64),
+        ("activeAlarm", alarm, _INT64),
+        ("operatingLevel", performance, _INT64),
+        ("filterState", filter_state, _INT64),
+        ("oilLevel", oil_level, _INT64),
+        ("inflowTemperature", inflow_temperature, _DOUBLE),
+        ("bearingTemperature", bearing_temperature, _DOUBLE),
+        ("alarmTimeRemaining", alarm_time_remaining, _INT64),
+    )
+    # Field names match the keys of PumpController.settings()
+    pump01_settings = (
+        ("filterDegradationRate", filter_degradation_rate, _INT64),
+        ("autoResetMinutes", auto_reset_minutes, _DOUBLE),
+        ("defaultOperatingLevel", default_operating_level, _INT64),
+        ("lastCommand", last_command, _STRING),
+        ("commandSuccess", command_success, _BOOLEAN),
+    )
+
+    # Add a PumpStatus structure to Pump01 that carries all of its values in a single node, so
+    # clients can receive a complete update with one notification per tick. It is added last
+    # so the NodeIds of the existing nodes stay the same.
+    await new_struct(server, idx, "PumpStatus", [
+        new_struct_field(name, varianttype) for name, _, varianttype in pump01_telemetry + pump01_settings
+    ])
+    PumpStatus = (await server.load_data_type_definitions())["PumpStatus"]
+    pump_status = await pump01.add_variable(idx, "pumpStatus", ua.Variant(PumpStatus(), ua.VariantType.ExtensionObject))
 
     # starting!
     async with server:
@@ -447,34 +626,109 @@ async def main():
         bearingTempValue = pump_controller.base_bearing_temp
         
         # Create a time-based cycle for temperature variation
-        cycle_start_time = time.time()
+        cycle_start_time = time.monotonic()
         temp_cycle_hours = 24  # 24-hour temperature cycle
+        # Phase advance per elapsed second, so the sine argument is a single multiply
+        two_pi_per_cycle = 2 * math.pi / (temp_cycle_hours * 3600.0)
+        
+        # Countdowns (in ticks) to the next random power failure and leakage
+        power_failure_chance = 0.002 * update_interval
+        power_failure_in = ticks_until_event(power_failure_chance)
+        leakage_chance = leakageProbability * update_interval
+        leakage_in = ticks_until_event(leakage_chance)
+        
+        # The variables written by the loop are fixed, so pair each NodeId with its VariantType once.
+        # The loop only produces the values, in the order of pump01_telemetry
+        telemetry_fields = tuple(name for name, _, _ in pump01_telemetry)
+        telemetry_targets = tuple((node.nodeid, varianttype) for _, node, varianttype in pump01_telemetry)
+        settings_fields = tuple(name for name, _, _ in pump01_settings)
+        settings_targets = tuple((node.nodeid, varianttype) for _, node, varianttype in pump01_settings)
+        # Last values written per target; None forces the first tick to publish everything
+        telemetry_last_values = [None] * len(telemetry_targets)
+        settings_last_values = [None] * len(settings_targets)
+        # NodeIds of the variables that are written separately
+        update_interval_nid = update_interval_var.nodeid
+        pump_status_nid = pump_status.nodeid
+        # Where the last value of each node is cached, so it can be forgotten again
+        cached_values = {}
+        for targets, last_values in ((telemetry_targets, telemetry_last_values),
+                                     (settings_targets, settings_last_values)):
+            for i, (nodeid, _) in enumerate(targets):
+                cached_values[nodeid] = (last_values, i)
+
+        def republish(nodeids):
+            """Forget the last value written to the given nodes, so the loop writes them again"""
+            for nodeid in nodeids:
+                if nodeid in cached_values:
+                    last_values, i = cached_values[nodeid]
+                    last_values[i] = None
+                    if last_values is settings_last_values:
+                        # Settings are only compared after the controller flagged a change
+                        pump_controller.settings_changed = True
+                elif nodeid == update_interval_nid:
+                    update_interval_changed.set()
+
+        def on_client_write(event, dispatcher):
+            """Restore the simulated values of variables that a client wrote to"""
+            republish(write_value.NodeId for write_value in event.request_params.NodesToWrite
+                      if write_value.AttributeId == _VALUE)
+
+        server.subscribe_server_callback(CallbackType.PostWrite, on_client_write)
+        
+        # Bind frequently used objects and functions to locals for the update loop
+        controller = pump_controller
+        _monotonic = time.monotonic
+        _rand = random.random
+        _sin = math.sin
+        
+        # Same store as server.write_attribute_value(), minus the wrapper layers;
+        # datachange callbacks still fire per value
+        write_attribute_value = server.iserver.aspace.write_attribute_value
+        # Writes are handed to a background task, so the simulation never waits on them.
+        # Values of a batch that failed are forgotten, so the next tick writes them again
+        write_queue = asyncio.Queue()
+        writer = asyncio.create_task(write_batches(write_attribute_value, write_queue, republish))
+        writer.add_done_callback(log_writer_exit)
         
+        # Settings as last read from the controller, reused for PumpStatus until they change
+        settings = controller.settings()
+        
+        next_tick = _monotonic() + update_interval
         while True:
-            # Use the configurable update interval
-            await asyncio.sleep(update_interval)
-            
-            # Update the update_interval variable in OPC UA
-            await server.write_attribute_value(
-                update_interval_var.nodeid, ua.DataValue(update_interval)
-            )
+            # Sleep until the next deadline of the configurable update interval,
+            # so a slow tick shortens the following sleep instead of adding drift.
+            # An overrun still waits for 0 to let the writer and client requests run.
+            # setUpdateInterval() wakes the wait up, so its new deadline applies at once
+            while True:
+                next_tick_changed.clear()
+                try:
+                    await asyncio.wait_for(next_tick_changed.wait(), max(0.0, next_tick - _monotonic()))
+                except asyncio.TimeoutError:
+                    break
+            # Single clock reading shared by everything computed in this tick
+            now = _monotonic()
+            next_tick += update_interval
+            # Never schedule in the past: after a stall the next tick is a full interval away,
+            # instead of replaying the missed ticks back to back
+            if next_tick <= now:
+                next_tick = now + update_interval
             
-            # Check if we should auto-reset from alarm state
-            if pump_controller.check_alarm_auto_reset():
+            # Check if we should auto-reset from alarm state (only worth a call while in alarm)
+            if controller.in_alarm_state and controller.check_alarm_auto_reset(now):
                 _logger.info("Auto-reset activated: clearing alarm and resetting filter")
                 filterStateValue = 100  # Reset filter to 100% clean
             
             # Get target level from the controller
-            targetLevel = pump_controller.target_level
+            targetLevel = controller.target_level
             
-            # Gradually approach target level with realistic ramp-up/down
-            if currentLevel < targetLevel:
-                currentLevel = min(targetLevel, currentLevel + random.randint(1, 5))
-            elif currentLevel > targetLevel:
-                currentLevel = max(targetLevel, currentLevel - random.randint(1, 3))
+            # Gradually approach target level with realistic ramp-up/down, without overshooting
+            level_delta = targetLevel - currentLevel
+            if level_delta:
+                level_step = int(_rand() * 5) + 1 if level_delta > 0 else -(int(_rand() * 3) + 1)
+                currentLevel += level_step if abs(level_step) < abs(level_delta) else level_delta
             
             # Determine pump state based on operating level
-            if pump_controller.in_alarm_state:
+            if controller.in_alarm_state:
                 pumpState = "Alarm"
             elif currentLevel == 0:
                 pumpState = "Idle"
@@ -482,54 +736,46 @@ async def main():
                 pumpState = "Running"
             
             # Handle manual filter reset
-            if pump_controller.last_command == "resetFilter" and pump_controller.command_success:
+            if controller.last_command == "resetFilter" and controller.command_success:
                 _logger.info("Manually resetting filter to 100%")
                 filterStateValue = 100
                 # Reset the command to avoid multiple resets
-                pump_controller.last_command = "None"
+                controller.last_command = "None"
+                controller.settings_changed = True
             
             # Handle manual oil change
-            if pump_controller.last_command == "changeOil" and pump_controller.command_success:
+            if controller.last_command == "changeOil" and controller.command_success:
                 _logger.info("Manually changing oil to 100%")
                 oilLevelValue = 100
                 # Reset the command to avoid multiple changes
-                pump_controller.last_command = "None"
+                controller.last_command = "None"
+                controller.settings_changed = True
             
             # Filter gets gradually clogged with usage - using configurable degradation rate
             if currentLevel > 0:
-                # Convert the per-minute rate to per-second
-                base_rate_per_second = pump_controller.filter_degradation_base_rate / 60.0
-                load_factor_per_second = pump_controller.filter_degradation_load_factor / 60.0
-                
                 # Calculate degradation based on current load and configured rates - scale by update_interval
-                degradation_rate = (base_rate_per_second + (currentLevel / 100.0) * load_factor_per_second) * update_interval
+                degradation_rate = (
+                    controller.filter_base_per_sec + (currentLevel * 0.01) * controller.filter_load_per_sec
+                ) * update_interval
                 filterStateValue = max(0, filterStateValue - degradation_rate)
+            # Whole percent value, as published and checked against the alarm threshold
+            filterStatePercent = int(filterStateValue)
             
             # Oil level decreases over time when pump is running
             if pumpState == "Running":
                 # Oil depletes based on operating level and run time
-                # At 100% operating level, oil should last for oil_change_hours
-                oil_depletion_per_hour = 100.0 / pump_controller.oil_change_hours
-                oil_depletion_per_second = oil_depletion_per_hour / 3600.0
-                
                 # Adjust depletion based on operating level (higher level = faster depletion)
                 # Scale by update_interval to account for varying update rates
-                oil_depletion = oil_depletion_per_second * (0.5 + currentLevel / 200.0) * update_interval
+                oil_depletion = controller.oil_depletion_per_sec * (0.5 + currentLevel * 0.005) * update_interval
                 
                 # Apply oil depletion
                 oilLevelValue = max(0, oilLevelValue - oil_depletion)
             
             # Calculate inflow temperature variation based on time
-            # Create a sinusoidal variation over the course of the day
-            hours_since_start = (time.time() - cycle_start_time) / 3600
-            cycle_position = (hours_since_start % temp_cycle_hours) / temp_cycle_hours
-            temp_amplitude = (pump_controller.max_inflow_temp - pump_controller.min_inflow_temp) / 2
-            temp_midpoint = (pump_controller.max_inflow_temp + pump_controller.min_inflow_temp) / 2
-            
-            # Sinusoidal temperature variation with some randomness
-            inflowTempValue = temp_midpoint + temp_amplitude * math.sin(cycle_position * 2 * math.pi)
+            # Create a sinusoidal variation over the course of the day, with some randomness
+            inflowTempValue = controller.temp_midpoint + controller.temp_amplitude * _sin((now - cycle_start_time) * two_pi_per_cycle)
             # Add small random variations
-            inflowTempValue += random.uniform(-0.5, 0.5)
+            inflowTempValue += _rand() - 0.5
             
             # Calculate bearing temperature based on operating level, oil level, and filter state
             # Start with a base temperature when idle
@@ -537,103 +783,102 @@ async def main():
                 # Bearing cools down slowly when pump is idle - scale by update_interval
                 bearing_cool_rate = 0.2 * update_interval
                 bearingTempValue = max(
-                    pump_controller.base_bearing_temp,
+                    controller.base_bearing_temp,
                     bearingTempValue - bearing_cool_rate
                 )
             else:
                 # Temperature increases with operating level
-                level_factor = currentLevel / 100.0
-                
-                # Low oil increases bearing temperature
-                oil_factor = 1.0 + max(0, (1.0 - oilLevelValue / 100.0) * 0.5)
-                
-                # Clogged filter increases bearing temperature
-                filter_factor = 1.0 + max(0, (1.0 - filterStateValue / 100.0) * 0.3)
+                # Low oil and a clogged filter increase it further (both levels stay within 0-100%)
+                oil_factor = 1.0 + (1.0 - oilLevelValue * 0.01) * 0.5
+                filter_factor = 1.0 + (1.0 - filterStateValue * 0.01) * 0.3
                 
-                # Calculate target temperature based on factors
-                target_bearing_temp = pump_controller.base_bearing_temp + (
-                    (pump_controller.max_bearing_temp - pump_controller.base_bearing_temp) * 
-                    level_factor * oil_factor * filter_factor
+                # Calculate target temperature based on factors, with small random variations
+                target_bearing_temp = (
+                    controller.base_bearing_temp
+                    + controller.bearing_span * (currentLevel * 0.01) * oil_factor * filter_factor
+                    + (_rand() - 0.5) * 0.4
                 )
                 
-                # Add small random variations
-                target_bearing_temp += random.uniform(-0.2, 0.2)
-                
-                # Approach target temperature gradually - scale by update_interval
-                if bearingTempValue < target_bearing_temp:
-                    bearing_heat_rate = 0.3 * update_interval
-                    bearingTempValue = min(target_bearing_temp, bearingTempValue + bearing_heat_rate)
-                else:
-                    bearing_cool_rate = 0.1 * update_interval
-                    bearingTempValue = max(target_bearing_temp, bearingTempValue - bearing_cool_rate)
-            
-            # Determine if an alarm condition exists
-            alarmValue = 0
-            alarmType = ""
-            
-            # Filter clogged alarm
-            if filterStateValue < 20 and not pump_controller.in_alarm_state:
-                alarmValue = 1
-                alarmType = "FilterClogged"
-                pump_controller.enter_alarm_state(alarmType)
-            
-            # Oil level alarm
-            if oilLevelValue < 15 and not pump_controller.in_alarm_state:
-                alarmValue = 1
-                alarmType = "OilLow"
-                pump_controller.enter_alarm_state(alarmType)
-            
-            # Bearing temperature alarm
-            if bearingTempValue > 75 and not pump_controller.in_alarm_state:
-                alarmValue = 1
-                alarmType = "BearingOverheated"
-                pump_controller.enter_alarm_state(alarmType)
+                # Approach target temperature gradually, heating faster than cooling - scale by update_interval
+                bearing_delta = target_bearing_temp - bearingTempValue
+                bearing_step = (0.3 if bearing_delta > 0 else -0.1) * update_interval
+                bearingTempValue += bearing_delta if abs(bearing_delta) < abs(bearing_step) else bearing_step
             
-            # Random power failure - scale probability by update_interval
-            if random.random() < (0.002 * update_interval) and not pump_controller.in_alarm_state:
-                alarmValue = 1
-                alarmType = "PowerFailure"
-                pump_controller.enter_alarm_state(alarmType)
+            # Count down to the random power failure and leakage events. The countdown is
+            # redrawn when the per-tick chance changes, which is valid as the draw is memoryless
+            chance = 0.002 * update_interval  # scale probability by update_interval
+            if chance != power_failure_chance:
+                power_failure_chance = chance
+                power_failure_in = ticks_until_event(chance)
+            power_failure_in -= 1
+            power_failure = power_failure_in <= 0
+            if power_failure:
+                power_failure_in = ticks_until_event(power_failure_chance)
             
             # Leakage probability increases with lower filter state - scale by update_interval
-            leakageChance = leakageProbability * (1 + (100 - filterStateValue)/20) * update_interval
-            if random.random() < leakageChance and not pump_controller.in_alarm_state:
-                alarmValue = 1
-                alarmType = "Leakage"
-                pump_controller.enter_alarm_state(alarmType)
+            chance = leakageProbability * (1 + (100 - filterStateValue)/20) * update_interval
+            if abs(chance - leakage_chance) > 0.01 * leakage_chance:
+                leakage_chance = chance
+                leakage_in = ticks_until_event(chance)
+            leakage_in -= 1
+            leakage = leakage_in <= 0
+            if leakage:
+                leakage_in = ticks_until_event(leakage_chance)
+            
+            # Determine if an alarm condition exists (alarmValue is raised below while in alarm state)
+            alarmValue = 0
+            if not controller.in_alarm_state:
+                if filterStatePercent < 20:
+                    # Filter clogged alarm
+                    alarmType = "FilterClogged"
+                elif oilLevelValue < 15:
+                    # Oil level alarm
+                    alarmType = "OilLow"
+                elif bearingTempValue > 75:
+                    # Bearing temperature alarm
+                    alarmType = "BearingOverheated"
+                elif power_failure:
+                    # Random power failure
+                    alarmType = "PowerFailure"
+                elif leakage:
+                    # Random leakage
+                    alarmType = "Leakage"
+                else:
+                    alarmType = None
+                if alarmType:
+                    controller.enter_alarm_state(alarmType)
             
             # Calculate alarm time remaining
             alarm_remaining_seconds = 0
-            if pump_controller.in_alarm_state:
-                elapsed_seconds = time.time() - pump_controller.alarm_start_time
-                total_seconds = pump_controller.auto_reset_minutes * 60
-                alarm_remaining_seconds = max(0, total_seconds - elapsed_seconds)
+            if controller.in_alarm_state:
+                total_seconds = controller.auto_reset_minutes * 60
+                alarm_remaining_seconds = max(0.0, total_seconds - (now - controller.alarm_start_time))
                 alarmValue = 1  # Ensure alarm is active if in alarm state
             
             # Calculate flow based on operating level with some natural variation
             maxFlowRate = 10.0
             # As filter clogs, flow rate decreases (down to 50% of normal)
-            filterFactor = 0.5 + (filterStateValue / 100) * 0.5
-            baseFlow = (currentLevel / 100) * maxFlowRate * filterFactor
-            flowValue = max(0, baseFlow * random.uniform(0.95, 1.05))
+            filterFactor = 0.5 + (filterStateValue * 0.01) * 0.5
+            baseFlow = (currentLevel * 0.01) * maxFlowRate * filterFactor
+            flowValue = max(0.0, baseFlow * (0.95 + _rand() * 0.10))
             
             # Calculate power consumption based on operating level, flow rate and pump state
             basePower = 100
             if currentLevel > 0:
                 # Calculate efficiency factor - decreases as filter clogs
                 # A clogged filter (0%) can make the pump up to 100% less efficient (2x power)
-                efficiency_factor = 1 + (1 - filterStateValue / 100) * 1.0  # 1.0-2.0 range
+                efficiency_factor = 1 + (1 - filterStateValue * 0.01) * 1.0  # 1.0-2.0 range
                 
                 # Base power depends on operating level
                 level_power = currentLevel * 5
                 
                 # Calculate increased power due to back-pressure from clogged filter
                 # More clogged = higher back-pressure = more power needed
-                clogging_resistance = (100 - filterStateValue) / 100  # 0-1 range
+                clogging_resistance = (100 - filterStateValue) * 0.01  # 0-1 range
                 clogging_power = level_power * clogging_resistance * 2  # Up to 2x additional power
                 
                 # Total power with some random variation
-                powerValue = (basePower + level_power * efficiency_factor + clogging_power) * random.uniform(0.95, 1.05)
+                powerValue = (basePower + level_power * efficiency_factor + clogging_power) * (0.95 + _rand() * 0.10)
             else:
                 powerValue = 0
                 
@@ -642,65 +887,43 @@ async def main():
             if pumpState == "Running":
                 runHoursValue += (update_interval / 3600) *12
             
-            # Calculate current filter degradation rate in minutes (for display)
-            current_degradation_rate = 30  # Default value
-            if pump_controller.filter_degradation_load_factor > 0:
-                current_degradation_rate = int(100.0 / (pump_controller.filter_degradation_base_rate + 
-                                                      pump_controller.filter_degradation_load_factor))
-            
-            # Write values to OPC UA server (only for Pump01)
-            await server.write_attribute_value(
-                power.nodeid, ua.DataValue(int(powerValue))
-            )
-            await server.write_attribute_value(
-                status.nodeid, ua.DataValue(pumpState)
-            )
-            await server.write_attribute_value(
-                flow.nodeid, ua.DataValue(float(flowValue))
-            )
-            await server.write_attribute_value(
-                run_hours.nodeid, ua.DataValue(int(runHoursValue))
-            )
-            await server.write_attribute_value(
-                alarm.nodeid, ua.DataValue(int(alarmValue))
-            )
-            await server.write_attribute_value(
-                performance.nodeid, ua.DataValue(int(currentLevel))
-            )
-            await server.write_attribute_value(
-                filter_state.nodeid, ua.DataValue(int(filterStateValue))
-            )
-            await server.write_attribute_value(
-                oil_level.nodeid, ua.DataValue(int(oilLevelValue))
-            )
-            await server.write_attribute_value(
-                inflow_temperature.nodeid, ua.DataValue(float(round(inflowTempValue, 1)))
-            )
-            await server.write_attribute_value(
-                bearing_temperature.nodeid, ua.DataValue(float(round(bearingTempValue, 1)))
-            )
-            await server.write_attribute_value(
-                alarm_time_remaining.nodeid, ua.DataValue(int(alarm_remaining_seconds))
-            )
-            await server.write_attribute_value(
-                filter_degradation_rate.nodeid, ua.DataValue(int(current_degradation_rate))
-            )
-            await server.write_attribute_value(
-                auto_reset_minutes.nodeid, ua.DataValue(float(pump_controller.auto_reset_minutes))
-            )
-            await server.write_attribute_value(
-                default_operating_level.nodeid, ua.DataValue(int(pump_controller.default_operating_level))
-            )
-            
-            # Update command status variables
-            await server.write_attribute_value(
-                last_command.nodeid, ua.DataValue(pump_controller.last_command)
-            )
-            await server.write_attribute_value(
-                command_success.nodeid, ua.DataValue(pump_controller.command_success)
+            # Write values to OPC UA server (only for Pump01), in the order of pump01_telemetry
+            values = (
+                int(powerValue),
+                pumpState,
+                flowValue,
+                int(runHoursValue),
+                alarmValue,
+                currentLevel,
+                filterStatePercent,
+                int(oilLevelValue),
+                round(inflowTempValue, 1),
+                round(bearingTempValue, 1),
+                int(alarm_remaining_seconds),
             )
+            # Only publish values that changed since the last tick
+            writes = changed_writes(telemetry_targets, values, telemetry_last_values)
+            # Configuration and command feedback only change through the pump methods (or the
+            # command reset above), so they are only checked after the controller flagged a change
+            if controller.settings_changed:
+                controller.settings_changed = False
+                settings = controller.settings()
+                settings_values = tuple(settings[name] for name in settings_fields)
+                writes += changed_writes(settings_targets, settings_values, settings_last_values)
+            if writes:
+                # Refresh the combined PumpStatus whenever any of its members changed
+                status_value = PumpStatus(**dict(zip(telemetry_fields, values)), **settings)
+                writes.append((pump_status_nid, _DV(_V(status_value, _EXTENSION_OBJECT))))
+            if update_interval_changed.is_set():
+                update_interval_changed.clear()
+                writes.append((update_interval_nid, _DV(_V(update_interval, _DOUBLE))))
+            if writes:
+                write_queue.put_nowait(writes)
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
+    # Run on the libuv-based event loop when available
+    if uvloop is not None:
+        uvloop.install()
     asyncio.run(main())
\ No newline at end of file